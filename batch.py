@@ -0,0 +1,108 @@
+import argparse
+import time
+
+from dataclasses import replace
+
+from bots import BotRegistry
+from main import add_config_arguments, create_game, load_config, Labyrinth
+
+
+class RaceBatch:
+    """
+    Independent races on one labyrinth advanced in lockstep in a single process.
+    The races share the map, its cell array and analysis, and the loaded bots.
+    Every tick the moves of all races go to one Labyrinth.trace_all call:
+    a move walked by any race is stored in the labyrinth's table of traces
+    and is not walked again by the others, moves far enough from walls
+    and the finish are not walked at all.
+    Each race gives the same results as its Game run alone with the same seed,
+    as long as its bots keep no state of their own between calls (the global
+    random module is reseeded by every race). batch.py --check verifies this.
+    """
+
+    def __init__(self, games):
+        self.games = games
+        for game in games:
+            game.rendered = False
+        self.labyrinth = games[0].labyrinth
+        self.time = 0
+
+    def move_cars(self):
+        self.time += 1
+        racing = [game for game in self.games if not game.over]
+        all_moves = [game.request_moves() for game in racing]
+        positions, velocities = [], []
+        for moves in all_moves:
+            for car, velocity in moves:
+                if velocity is not None:
+                    positions.append(car.get_position())
+                    velocities.append(velocity)
+        traces = iter(self.labyrinth.trace_all(positions, velocities))
+        for game, moves in zip(racing, all_moves):
+            game.apply_moves(moves, traces)
+
+    def check_winners(self):
+        for game in self.games:
+            if not game.over:
+                game.check_winners()
+
+    def run(self, max_ticks=None) -> list[list]:
+        while any(not game.over for game in self.games) and (max_ticks is None or self.time < max_ticks):
+            self.move_cars()
+            self.check_winners()
+        return [game.results for game in self.games]
+
+
+def create_batch(config, seeds, bots=None) -> RaceBatch:
+    labyrinth = Labyrinth(config.level, True, config)
+    bots = bots or BotRegistry()
+    return RaceBatch([create_game(replace(config, seed=seed), headless=True,
+                                  labyrinth=labyrinth, bots=bots) for seed in seeds])
+
+
+def race_state(game) -> tuple:
+    return game.results, sorted((car.name, car.get_position(), car.get_velocity()) for car in game.cars)
+
+
+def check_batch(batch, config, seeds, max_ticks=None) -> list:
+    """Runs every race of the batch again alone. Returns the seeds of races that ended differently."""
+    mismatches = []
+    bots = BotRegistry()
+    for seed, batched in zip(seeds, batch.games):
+        game = create_game(replace(config, seed=seed), headless=True,
+                           labyrinth=batch.labyrinth, bots=bots)
+        while not game.over and (max_ticks is None or game.time < max_ticks):
+            game.move_cars()
+            game.check_winners()
+        if race_state(game) != race_state(batched):
+            mismatches.append(seed)
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many races on one map in a single process.")
+    add_config_arguments(parser, many=True)
+    parser.add_argument("--races", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first race, the next ones get seed + 1, ...")
+    parser.add_argument("--max-ticks", type=int, default=None)
+    parser.add_argument("--check", action="store_true", help="run every race again alone and compare")
+    args = parser.parse_args()
+
+    configs = [load_config(path, args.level) for path in args.config or [None]]
+    bots = BotRegistry()
+    seeds = range(args.seed, args.seed + args.races)
+    for path, config in zip(args.config or ["default"], configs):
+        batch = create_batch(config, seeds, bots)
+        start = time.perf_counter()
+        results = batch.run(args.max_ticks)
+        elapsed = time.perf_counter() - start
+        for seed, result in zip(seeds, results):
+            print(f"{path} {seed}: " + ", ".join(f"{name}: {ticks}" for name, ticks in result))
+        print(f"{path}: {args.races} races, {batch.time} ticks in {elapsed:.2f} s")
+        if args.check:
+            mismatches = check_batch(batch, config, seeds, args.max_ticks)
+            print(f"{path}: " + (f"differ when run alone: {mismatches}" if mismatches else "same as run alone"))
+
+
+if __name__ == '__main__':
+    main()
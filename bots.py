@@ -0,0 +1,180 @@
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+
+from timelimit import time_limit, TimeoutException
+
+BOTS_MANIFEST = "bots.json"
+CACHE_FILE = ".bots_cache.json"
+PACKAGE_PREFIX = "player_"
+# time to start the smoke test process and import the bot, on top of the move time limit
+STARTUP_TIME = 10
+# the car is at (1, 2) and marked "C" like Game.symbol_map does
+SMOKE_TRACK = ["#####",
+               "#...#",
+               "#C.F#",
+               "#####"]
+
+
+class BotError(Exception):
+    pass
+
+
+def discover(root=".") -> dict[str, str]:
+    """
+    Find bot modules without importing them: every module of a
+    player_* package is a bot named by its dotted path, e.g. "player_demo.bot".
+    """
+    result = {}
+    for package in sorted(os.listdir(root)):
+        package_dir = os.path.join(root, package)
+        if not package.startswith(PACKAGE_PREFIX) or not os.path.isdir(package_dir):
+            continue
+        for filename in sorted(os.listdir(package_dir)):
+            if filename.endswith(".py") and filename != "__init__.py":
+                module = f"{package}.{filename[:-3]}"
+                result[module] = module
+    return result
+
+
+class BotRegistry:
+    """
+    Maps bot names to modules and imports a bot only when a lineup asks for it.
+    Names come from player_* packages and, optionally, from a JSON manifest
+    {"name": "package.module"} or {"name": "package.module:function"}.
+    Validation results are cached on disk until the bot file changes.
+    """
+
+    def __init__(self, root=".", manifest=BOTS_MANIFEST, cache_file=CACHE_FILE):
+        self.root = root
+        self.bots = discover(root)
+        manifest_path = os.path.join(root, manifest)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                self.bots.update(json.load(f))
+        self.cache_path = os.path.join(root, cache_file)
+        self.cache = {}
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, encoding="utf-8") as f:
+                    self.cache = json.load(f)
+            except ValueError:
+                self.cache = {}
+        self.loaded = {}
+
+    def names(self) -> list[str]:
+        return sorted(self.bots)
+
+    def target(self, name):
+        if name not in self.bots:
+            raise BotError(f"Unknown bot: {name}")
+        module, _, function = self.bots[name].partition(":")
+        return module, function or "move"
+
+    def source_file(self, name):
+        module, _ = self.target(name)
+        path = os.path.join(self.root, *module.split("."))
+        for candidate in (path + ".py", os.path.join(path, "__init__.py")):
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    def load(self, name):
+        if name not in self.loaded:
+            module, function = self.target(name)
+            try:
+                move = getattr(importlib.import_module(module), function)
+            except Exception as e:
+                raise BotError(f"{name}: {e!r}") from e
+            if not callable(move):
+                raise BotError(f"{name}: {function} is not callable")
+            self.loaded[name] = move
+        return self.loaded[name]
+
+    def cache_key(self, name, seconds=1):
+        path = self.source_file(name)
+        if path is None:
+            return None
+        stat = os.stat(path)
+        return f"{self.bots[name]}:{stat.st_mtime_ns}:{stat.st_size}:{seconds}"
+
+    def validate(self, name, seconds=1) -> str:
+        """
+        Import the bot and make one move on a tiny track in a separate process,
+        so a bot that keeps state between calls starts the race untouched.
+        seconds --- time limit of the move, the one of the race.
+        Returns an empty string for a valid bot, otherwise the error.
+        Timeouts are not cached: a busy machine may slow down a good bot.
+        """
+        if name not in self.bots:
+            return f"Unknown bot: {name}"
+        key = self.cache_key(name, seconds)
+        if key is not None and key in self.cache:
+            return self.cache[key]
+        command = [sys.executable, os.path.abspath(__file__), name, "--root", os.path.abspath(self.root),
+                   "--time-limit", str(seconds)]
+        try:
+            process = subprocess.run(command, capture_output=True, text=True, timeout=seconds + STARTUP_TIME)
+        except subprocess.TimeoutExpired:
+            return "timed out"
+        lines = process.stdout.splitlines()
+        try:
+            error = json.loads(lines[-1]) if lines else None
+        except ValueError:
+            error = None
+        if not isinstance(error, str):
+            stderr = process.stderr.strip().splitlines()
+            error = f"smoke test crashed: {stderr[-1] if stderr else f'exit code {process.returncode}'}"
+        if error == "timed out":
+            return error
+        if key is not None:
+            self.cache[key] = error
+            self.save_cache()
+        return error
+
+    def is_valid(self, name, seconds=1) -> bool:
+        return not self.validate(name, seconds)
+
+    def save_cache(self):
+        try:
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f, indent=1)
+        except OSError:
+            pass
+
+
+def smoke_test(move, seconds=1) -> str:
+    try:
+        with time_limit(seconds):
+            vx, vy = move(SMOKE_TRACK[:], (1, 2), (0, 0))
+        if abs(vx) > 1 or abs(vy) > 1:
+            return f"illegal acceleration {(vx, vy)}"
+    except TimeoutException:
+        return "timed out"
+    except Exception as e:
+        return repr(e)
+    return ""
+
+
+def main():
+    # run by BotRegistry.validate, prints the error as the last line of the output
+    parser = argparse.ArgumentParser(description="Make one move of a bot on a tiny track.")
+    parser.add_argument("bot")
+    parser.add_argument("--root", default=".")
+    parser.add_argument("--time-limit", type=float, default=1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, args.root)
+    registry = BotRegistry(args.root)
+    try:
+        error = smoke_test(registry.load(args.bot), args.time_limit)
+    except BotError as e:
+        error = str(e)
+    print(json.dumps(error))
+
+
+if __name__ == '__main__':
+    main()
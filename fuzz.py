@@ -0,0 +1,133 @@
+import argparse
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from random import Random
+from statistics import quantiles
+
+from bots import BotRegistry, BotError
+from main import Labyrinth, MAPS_DIR, TIME_LIMIT
+from timelimit import time_limit, TimeoutException
+
+MAX_SPEED = 5
+MAX_CARS = 6
+CHUNK_SIZE = 250
+
+
+def load_tracks() -> dict[str, list[str]]:
+    tracks = {}
+    for filename in sorted(os.listdir(MAPS_DIR)):
+        if filename.endswith(".tmx"):
+            tracks[filename] = Labyrinth(filename, headless=True).symbols
+        elif filename.endswith(".txt"):
+            with open(f"{MAPS_DIR}/{filename}", encoding="utf-8") as f:
+                tracks[filename] = f.read().split()
+    return tracks
+
+
+def random_case(track, free_cells, rng):
+    position = rng.choice(free_cells)
+    velocity = rng.randint(-MAX_SPEED, MAX_SPEED), rng.randint(-MAX_SPEED, MAX_SPEED)
+    track_map = track[:]
+    for x, y in rng.sample(free_cells, min(len(free_cells), rng.randint(0, MAX_CARS - 1))) + [position]:
+        track_map[y] = track_map[y][:x] + "C" + track_map[y][x + 1:]
+    return track_map, position, velocity
+
+
+def check_move(result, velocity) -> str:
+    if not isinstance(result, (tuple, list)) or len(result) != 2 or \
+            not all(isinstance(v, int) for v in result):
+        return "bad result"
+    if abs(result[0] - velocity[0]) > 1 or abs(result[1] - velocity[1]) > 1:
+        return "illegal acceleration"
+    return ""
+
+
+def add_problem(problems, problem, case):
+    if problem in problems:
+        problems[problem][0] += 1
+    else:
+        problems[problem] = [1, case]
+
+
+def fuzz_chunk(bot, map_name, track, calls, seed, seconds=TIME_LIMIT) -> dict:
+    move = BotRegistry().load(bot)
+    rng = Random(seed)
+    free_cells = [(x, y) for y, line in enumerate(track) for x, symb in enumerate(line) if symb != "#"]
+    report = {"calls": 0, "errors": {}, "illegal": {}, "latencies": []}
+    for _ in range(calls):
+        track_map, position, velocity = random_case(track, free_cells, rng)
+        case = f"{map_name} position={position} velocity={velocity}"
+        report["calls"] += 1
+        start = time.perf_counter()
+        try:
+            with time_limit(seconds):
+                result = move(track_map, position, velocity)
+        except TimeoutException:
+            add_problem(report["errors"], "timed out", case)
+            continue
+        except Exception as e:
+            add_problem(report["errors"], repr(e), case)
+            continue
+        finally:
+            report["latencies"].append(time.perf_counter() - start)
+        if problem := check_move(result, velocity):
+            add_problem(report["illegal"], problem, f"{case} result={result!r}")
+    return report
+
+
+def fuzz(bot, calls=1000, workers=None, seed=0, seconds=TIME_LIMIT) -> dict:
+    """
+    Call the bot on random positions and velocities of every map in MAPS_DIR.
+    Returns the number of calls, errors and illegal moves as
+    {problem: [count, first case]}, and latency percentiles in milliseconds.
+    """
+    tracks = load_tracks()
+    tasks = []
+    for map_name, track in tracks.items():
+        for start in range(0, calls, CHUNK_SIZE):
+            tasks.append((bot, map_name, track, min(CHUNK_SIZE, calls - start), seed + len(tasks), seconds))
+    result = {"calls": 0, "errors": {}, "illegal": {}, "latencies": []}
+    with ProcessPoolExecutor(workers) as executor:
+        for report in executor.map(fuzz_chunk, *zip(*tasks)):
+            result["calls"] += report["calls"]
+            result["latencies"] += report["latencies"]
+            for key in ("errors", "illegal"):
+                for problem, (count, case) in report[key].items():
+                    result[key].setdefault(problem, [0, case])[0] += count
+    latencies = sorted(result.pop("latencies"))
+    if len(latencies) > 1:
+        percentiles = quantiles(latencies, n=100, method="inclusive")
+        result["latency_ms"] = {"p50": percentiles[49] * 1000, "p90": percentiles[89] * 1000,
+                                "p99": percentiles[98] * 1000, "max": latencies[-1] * 1000}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a bot on random positions of all maps.")
+    parser.add_argument("bot", help="bot name, e.g. player_demo.bot")
+    parser.add_argument("--calls", type=int, default=1000, help="calls per map")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--time-limit", type=float, default=TIME_LIMIT,
+                        help="seconds per move, the time_limit of the race config")
+    args = parser.parse_args()
+
+    try:
+        BotRegistry().load(args.bot)
+    except BotError as e:
+        print(f"Bot error! {e}")
+        return
+    result = fuzz(args.bot, args.calls, args.workers, args.seed, args.time_limit)
+    print(f"{args.bot}: {result['calls']} calls")
+    for key, title in (("errors", "Errors"), ("illegal", "Illegal moves")):
+        print(f"{title}: {sum(count for count, case in result[key].values())}")
+        for problem, (count, case) in result[key].items():
+            print(f"    {problem} x{count}, e.g. {case}")
+    if "latency_ms" in result:
+        print("Latency, ms: " + ", ".join(f"{name} {value:.3f}" for name, value in result["latency_ms"].items()))
+
+
+if __name__ == '__main__':
+    main()
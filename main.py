@@ -1,36 +1,48 @@
+import json
 import pygame
 import pytmx
+import random
+import sys
 
+from collections import OrderedDict
+from copy import deepcopy
+from dataclasses import dataclass, field, fields, replace
 from math import atan2, pi
-from random import randint, shuffle, random
+from random import randint, Random
 from timelimit import time_limit, TimeoutException
-
-from player_demo.bot_my import move as move0
-from player_dm.bot import move as move1
-from player_slow.bot import move as move2
-from player_demo.ArSarapkin import move as move_sarapkin
-from player_demo.Dima_Kuznetsov_bot import move as move_kuznetsov
-from player_demo.bot_kot import move as move_kot
-from player_demo.shaposhnik import move as move_shap
-from player_demo.WA1 import move as move_kmes
-from player_demo.bot_kosyak import move as move_kosyak
-from player_demo.PAPRIKAZUGENERALAGAVSA import move as move_pronkin
-from player_demo.bot_kolobov import move as move_kolobov
-from player_demo.not_a_griefer import move as move_timofey
-
-PLAYERS = [{"name": "ArSarapkin", "bot": move_sarapkin, "img": 0, "level": 0.3},
-           {"name": "Dima Kuznetsov", "bot": move_kuznetsov, "img": 1, "level": 0.3},
-           {"name": "Daniil Kotelnikov", "bot": move_kot, "img": 2, "level": 0.3},
-           # {"name": "Shaposhnik", "bot": move_shap, "img": 3, "level": 0.3},
-           # {"name": "Andrey Kolobov", "bot": move_kolobov, "img": 3, "level": 0.3},
-           {"name": "kmes", "bot": move_kmes, "img": 4, "level": 0.3},
-           # {"name": "Kosyak", "bot": move_kosyak, "img": 5, "level": 0.3},
-           # {"name": "Dima Pronkin", "bot": move_pronkin, "img": 5, "level": 0.3},
-           # {"name": "Timofey", "bot": move_timofey, "img": 1, "level": 0.3},
-           {"name": "Speedy", "bot": move1, "img": 3, "level": 0.3},
-           {"name": "McQueen", "bot": move2, "img": 5, "level": 0.3},
+from map_analysis import MapAnalysis, WALL, FREE, FINISH
+from shared_map import SharedTrack
+from telemetry import TelemetryServer
+
+from bots import BotRegistry
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    tomllib = None
+
+PLAYERS = [{"name": "ArSarapkin", "bot": "player_demo.ArSarapkin", "img": 0, "level": 0.3},
+           {"name": "Dima Kuznetsov", "bot": "player_demo.Dima_Kuznetsov_bot", "img": 1, "level": 0.3},
+           {"name": "Daniil Kotelnikov", "bot": "player_demo.bot_kot", "img": 2, "level": 0.3},
+           # {"name": "Shaposhnik", "bot": "player_demo.shaposhnik", "img": 3, "level": 0.3},
+           # {"name": "Andrey Kolobov", "bot": "player_demo.bot_kolobov", "img": 3, "level": 0.3},
+           {"name": "kmes", "bot": "player_demo.WA1", "img": 4, "level": 0.3},
+           # {"name": "Kosyak", "bot": "player_demo.bot_kosyak", "img": 5, "level": 0.3},
+           # {"name": "Dima Pronkin", "bot": "player_demo.PAPRIKAZUGENERALAGAVSA", "img": 5, "level": 0.3},
+           # {"name": "Timofey", "bot": "player_demo.not_a_griefer", "img": 1, "level": 0.3},
+           {"name": "Speedy", "bot": "player_dm.bot", "img": 3, "level": 0.3},
+           {"name": "McQueen", "bot": "player_slow.bot", "img": 5, "level": 0.3},
            ]
 WINDOW_SIZE = WINDOW_WIDTH, WINDOW_HEIGHT = 1300, 1000
+LEGEND_WIDTH = 300
+MAP_VIEW_SIZE = WINDOW_WIDTH - LEGEND_WIDTH, WINDOW_HEIGHT
+MIN_TILE_SIZE = 8
+CHUNK_SIZE = 8
+CHUNK_CACHE_SIZE = 128
+TRACE_CACHE_SIZE = 200000
+ZOOM_STEP = 1.25
+MIN_ZOOM, MAX_ZOOM = 0.25, 4
+COLLISION_LAYER = "collision"
 FPS = 20
 MAPS_DIR = "maps"
 IMAGES_DIR = "images"
@@ -38,35 +50,273 @@ LEVELS = ["map1.tmx", "map2.tmx", "map3.tmx", "map4.tmx"]
 CURRENT_LEVEL = 3
 EVENT_TYPE = 30
 DELAY = 300
-FRAMES_PER_TICK = FPS * DELAY // 1000
 WINNERS_NUMBER = 4
+TIME_LIMIT = 1
+CAR_IMAGES_NUMBER = 6
+START_TILES = [78, 47]
+FINISH_TILES = [79, 449]
+ROAD_TILES = [175]
+START_ANGLES = {78: 0, 47: -90}
+TELEMETRY = False  # broadcast the race to spectators, see telemetry.py
+
+
+def is_integer(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+@dataclass
+class RaceConfig:
+    """
+    Rules of one race. The module constants above are the defaults,
+    a config file (TOML or JSON) with the same keys in lower case overrides them.
+    """
+    level: str = LEVELS[CURRENT_LEVEL]
+    players: list[dict] = field(default_factory=lambda: deepcopy(PLAYERS))
+    winners_number: int = WINNERS_NUMBER
+    fps: int = FPS
+    delay: int = DELAY
+    time_limit: float = TIME_LIMIT
+    seed: int | None = None
+    start_tiles: list[int] = field(default_factory=lambda: list(START_TILES))
+    finish_tiles: list[int] = field(default_factory=lambda: list(FINISH_TILES))
+    road_tiles: list[int] = field(default_factory=lambda: list(ROAD_TILES))
+    start_angles: dict[int, int] = field(default_factory=lambda: dict(START_ANGLES))
+
+    def __post_init__(self):
+        try:
+            # TOML and JSON keys are always strings
+            self.start_angles = {int(tile): angle for tile, angle in self.start_angles.items()}
+        except (AttributeError, TypeError, ValueError):
+            raise ValueError(f"Bad race config: start_angles should map tile ids to angles, "
+                             f"got {self.start_angles!r}") from None
+        if errors := self.check():
+            raise ValueError("Bad race config: " + "; ".join(errors))
+
+    def check(self) -> list[str]:
+        errors = []
+        if not isinstance(self.level, str):
+            errors.append(f"level should be a map file name, got {self.level!r}")
+        for name in ("winners_number", "fps", "delay"):
+            value = getattr(self, name)
+            if not is_integer(value) or value < 1:
+                errors.append(f"{name} should be a positive integer, got {value!r}")
+        if not errors and self.frames_per_tick < 1:
+            errors.append(f"a tick should last at least one frame, got fps={self.fps} and delay={self.delay} ms")
+        if not is_number(self.time_limit) or self.time_limit <= 0:
+            errors.append(f"time_limit should be a positive number of seconds, got {self.time_limit!r}")
+        if self.seed is not None and not is_integer(self.seed):
+            errors.append(f"seed should be an integer, got {self.seed!r}")
+        for name in ("start_tiles", "finish_tiles", "road_tiles"):
+            value = getattr(self, name)
+            if not isinstance(value, list) or not all(is_integer(tile) for tile in value):
+                errors.append(f"{name} should be a list of tile ids, got {value!r}")
+        if not all(is_number(angle) for angle in self.start_angles.values()):
+            errors.append(f"start_angles should be numbers, got {self.start_angles!r}")
+        elif isinstance(self.start_tiles, list) and (missing := set(self.start_tiles) - set(self.start_angles)):
+            errors.append(f"start_angles has no angle for the start tiles {sorted(missing)}")
+        if not isinstance(self.players, list):
+            errors.append(f"players should be a list, got {self.players!r}")
+            return errors
+        for player in self.players:
+            if not isinstance(player, dict) or not {"name", "bot", "img", "level"} <= set(player):
+                errors.append(f"a player should have a name, bot, img and level, got {player!r}")
+            elif not is_integer(player["img"]) or not 0 <= player["img"] < CAR_IMAGES_NUMBER:
+                errors.append(f"{player['name']}: img should be from 0 to {CAR_IMAGES_NUMBER - 1}, got {player['img']!r}")
+            elif not is_number(player["level"]):
+                errors.append(f"{player['name']}: level should be a number, got {player['level']!r}")
+        return errors
+
+    @property
+    def frames_per_tick(self):
+        return self.fps * self.delay // 1000
+
+    @classmethod
+    def load(cls, path) -> "RaceConfig":
+        if path.endswith(".toml"):
+            if tomllib is None:
+                raise RuntimeError("TOML configs need Python 3.11+, use JSON instead")
+            with open(path, "rb") as f:
+                data = tomllib.load(f)
+        else:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        names = {f.name for f in fields(cls)}
+        if unknown := set(data) - names:
+            raise ValueError(f"Unknown race config keys: {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+
+class Camera:
+    """
+    Part of the map shown on the screen: zoom and the top left corner of the view in map pixels.
+    """
+
+    def __init__(self, labyrinth, view_size=MAP_VIEW_SIZE):
+        self.labyrinth = labyrinth
+        self.view_width, self.view_height = view_size
+        self.zoom = 1
+        self.x = 0
+        self.y = 0
+
+    @property
+    def tile_size(self):
+        return max(1, round(self.labyrinth.tile_size * self.zoom))
+
+    def get_offset(self):
+        return self.x, self.y
+
+    def get_rect(self):
+        return pygame.Rect(0, 0, min(self.view_width, self.labyrinth.width * self.tile_size),
+                           min(self.view_height, self.labyrinth.height * self.tile_size))
+
+    def clamp(self):
+        self.x = max(0, min(self.x, self.labyrinth.width * self.tile_size - self.view_width))
+        self.y = max(0, min(self.y, self.labyrinth.height * self.tile_size - self.view_height))
+
+    def scroll(self, dx, dy):
+        self.x += dx
+        self.y += dy
+        self.clamp()
+
+    def set_zoom(self, zoom, center=None):
+        # the map point under center (screen pixels) stays in place
+        if center is None:
+            center = self.view_width // 2, self.view_height // 2
+        map_x = (self.x + center[0]) / self.tile_size
+        map_y = (self.y + center[1]) / self.tile_size
+        self.zoom = min(MAX_ZOOM, max(MIN_ZOOM, zoom))
+        self.x = round(map_x * self.tile_size - center[0])
+        self.y = round(map_y * self.tile_size - center[1])
+        self.clamp()
+
+    def center_on(self, position):
+        row, col = position
+        self.x = round((col + 0.5) * self.tile_size - self.view_width / 2)
+        self.y = round((row + 0.5) * self.tile_size - self.view_height / 2)
+        self.clamp()
 
 
 class Labyrinth:
 
-    def __init__(self, filename):
-        self.track = pytmx.load_pygame(f"{MAPS_DIR}/{filename}")
+    def __init__(self, filename, headless=False, config=None):
+        self.config = config or RaceConfig()
+        if headless:
+            self.track = pytmx.TiledMap(f"{MAPS_DIR}/{filename}")
+        else:
+            self.track = pytmx.load_pygame(f"{MAPS_DIR}/{filename}")
         self.height = self.track.height
         self.width = self.track.width
-        self.tile_size = min(WINDOW_HEIGHT // self.height, WINDOW_WIDTH // self.width)
-        self.start_tiles = [78, 47]
-        self.finish_tiles = [79, 449]
-        self.free_tiles = [175] + self.start_tiles + self.finish_tiles
-        self.start_angles = {78: 0, 47: -90}
-
-    def render(self, screen):
-        for row in range(self.height):
-            for col in range(self.width):
-                tile_image = self.track.get_tile_image(col, row, 0)
-                if tile_image:
-                    image = pygame.transform.smoothscale(tile_image, (self.tile_size, self.tile_size))
-                    screen.blit(image, (col * self.tile_size, row * self.tile_size))
+        self.tile_size = max(MIN_TILE_SIZE, min(MAP_VIEW_SIZE[1] // self.height, MAP_VIEW_SIZE[0] // self.width))
+        self.tile_layers = [i for i, layer in enumerate(self.track.layers) if isinstance(layer, pytmx.TiledTileLayer)]
+        # cars collide with the layer named "collision", the first tile layer if there is no such layer,
+        # other layers are decorations
+        self.collision_layer = next((i for i in self.tile_layers
+                                     if self.track.layers[i].name.lower() == COLLISION_LAYER), self.tile_layers[0])
+        self.tiles = self.build_tiles()
+        self.animations = {gid: props["frames"] for gid, props in self.track.tile_properties.items()
+                           if props.get("frames")}
+        self.camera = Camera(self)
+        self.chunks = OrderedDict()
+        self.chunk_cache_size = CHUNK_CACHE_SIZE
+        self.chunk_animations = {}
+        self.scaled_tiles = {}
+        self.start_tiles = self.config.start_tiles
+        self.finish_tiles = self.config.finish_tiles
+        self.free_tiles = self.config.road_tiles + self.start_tiles + self.finish_tiles
+        self.start_angles = self.config.start_angles
+        self.symbols = self.build_symbol_map()
+        self.analysis = MapAnalysis.load(self.symbols, f"{MAPS_DIR}/{filename}")
+        self.cells = self.analysis.cells
+        # walked moves (cell index, vy, vx) -> trace_all result, shared by all races on the labyrinth
+        self.traces = {}
+
+    def build_tiles(self) -> list[list[int]]:
+        data = self.track.layers[self.collision_layer].data
+        return [[self.track.tiledgidmap[gid] if gid else 0 for gid in line] for line in data]
+
+    def render(self, screen, camera=None, now=None):
+        """
+        Draws the map by chunks of CHUNK_SIZE x CHUNK_SIZE tiles. Only chunks in the view are drawn,
+        a chunk is redrawn only after zooming or when one of its animated tiles changes the frame.
+        now --- time of the frame in ms for animated tiles, the time since pygame.init() by default.
+        """
+        camera = camera or self.camera
+        tile_size = camera.tile_size
+        chunk_pixels = CHUNK_SIZE * tile_size
+        x, y = camera.get_offset()
+        rect = camera.get_rect()
+        if now is None:
+            now = pygame.time.get_ticks()
+        rows = range(y // chunk_pixels, (y + rect.height - 1) // chunk_pixels + 1)
+        cols = range(x // chunk_pixels, (x + rect.width - 1) // chunk_pixels + 1)
+        # keep at least twice the visible chunks, so scrolling back does not redraw them
+        self.chunk_cache_size = max(CHUNK_CACHE_SIZE, 2 * len(rows) * len(cols))
+        for chunk_row in rows:
+            for chunk_col in cols:
+                chunk = self.get_chunk((chunk_row, chunk_col), tile_size, now)
+                screen.blit(chunk, (chunk_col * chunk_pixels - x, chunk_row * chunk_pixels - y))
+
+    def get_chunk(self, chunk, tile_size, now):
+        if chunk not in self.chunk_animations:
+            self.chunk_animations[chunk] = sorted({gid for row, col in self.chunk_cells(chunk)
+                                                   for gid in self.get_gids((row, col)) if gid in self.animations})
+        frames = tuple(self.get_frame_gid(gid, now) for gid in self.chunk_animations[chunk])
+        cached = self.chunks.get(chunk)
+        if cached is None or cached[0] != tile_size or cached[1] != frames:
+            cached = tile_size, frames, self.draw_chunk(chunk, tile_size, now)
+            self.chunks[chunk] = cached
+            if len(self.chunks) > self.chunk_cache_size:
+                self.chunks.popitem(last=False)
+        self.chunks.move_to_end(chunk)
+        return cached[2]
+
+    def chunk_cells(self, chunk):
+        chunk_row, chunk_col = chunk
+        for row in range(chunk_row * CHUNK_SIZE, min((chunk_row + 1) * CHUNK_SIZE, self.height)):
+            for col in range(chunk_col * CHUNK_SIZE, min((chunk_col + 1) * CHUNK_SIZE, self.width)):
+                yield row, col
+
+    def get_gids(self, position) -> list[int]:
+        row, col = position
+        return [self.track.layers[i].data[row][col] for i in self.tile_layers if self.track.layers[i].visible]
+
+    def get_frame_gid(self, gid, now):
+        frames = self.animations.get(gid)
+        if not frames:
+            return gid
+        now %= sum(frame.duration for frame in frames) or 1
+        for frame in frames:
+            if now < frame.duration:
+                return frame.gid
+            now -= frame.duration
+        return frames[-1].gid
+
+    def draw_chunk(self, chunk, tile_size, now):
+        if self.scaled_tiles and next(iter(self.scaled_tiles))[1] != tile_size:
+            self.scaled_tiles.clear()
+        chunk_row, chunk_col = chunk
+        surface = pygame.Surface((CHUNK_SIZE * tile_size, CHUNK_SIZE * tile_size))
+        for row, col in self.chunk_cells(chunk):
+            for gid in self.get_gids((row, col)):
+                if not gid:
+                    continue
+                gid = self.get_frame_gid(gid, now)
+                if (gid, tile_size) not in self.scaled_tiles:
+                    tile_image = self.track.get_tile_image_by_gid(gid)
+                    if tile_image:
+                        tile_image = pygame.transform.smoothscale(tile_image, (tile_size, tile_size))
+                    self.scaled_tiles[(gid, tile_size)] = tile_image
+                if image := self.scaled_tiles[(gid, tile_size)]:
+                    surface.blit(image, ((col - chunk_col * CHUNK_SIZE) * tile_size,
+                                         (row - chunk_row * CHUNK_SIZE) * tile_size))
+        return surface
 
     def get_tile_id(self, position):
-        gid = self.track.get_tile_gid(position[1], position[0], 0)
-        if gid == 0:
-            return 0
-        return self.track.tiledgidmap[gid]
+        return self.tiles[position[0]][position[1]]
 
     def get_start_positions(self) -> list[tuple[int, int]]:
         result = []
@@ -79,17 +329,88 @@ class Labyrinth:
     def is_in_map(self, position):
         return 0 <= position[0] < self.height and 0 <= position[1] < self.width
 
+    def get_cell(self, position):
+        if not self.is_in_map(position):
+            return WALL
+        return self.cells[position[0] * self.width + position[1]]
+
     def is_free(self, position):
-        return self.get_tile_id(position) in self.free_tiles
+        return self.get_cell(position) != WALL
 
     def is_finish(self, position):
-        return self.get_tile_id(position) in self.finish_tiles
+        return self.get_cell(position) == FINISH
+
+    def trace(self, position, velocity) -> tuple[tuple[int, int], int]:
+        return self.trace_all([position], [velocity])[0]
+
+    def trace_all(self, positions, velocities) -> list[tuple[tuple[int, int], int]]:
+        """
+        Walks every move cell by cell along its line. For each move returns the cell
+        where the car stops and its kind: FREE if the car keeps its velocity,
+        FINISH or WALL if it stopped there earlier. A mostly vertical move that
+        reaches the finish stops there but keeps its velocity, so its kind is FREE
+        (the same rule as in local_test.py). Cells outside the map are walls.
+        """
+        cells, height, width = self.cells, self.height, self.width
+        obstacle_distance = self.analysis.obstacle_distance
+        traces = self.traces
+        result = []
+        for (row, col), (vy, vx) in zip(positions, velocities):
+            key = None
+            if 0 <= row < height and 0 <= col < width:
+                if max(abs(vy), abs(vx)) < obstacle_distance[row * width + col]:
+                    # no wall or finish around closer than the move: nothing to walk
+                    result.append(((row + vy, col + vx), FREE))
+                    continue
+                key = row * width + col, vy, vx
+                if key in traces:
+                    result.append(traces[key])
+                    continue
+            if abs(vx) > abs(vy):
+                shift = 1 if vx > 0 else -1
+                path = ((row + round(vy * (x - col) / vx), x) for x in range(col, col + vx + shift, shift))
+            elif vy:
+                shift = 1 if vy > 0 else -1
+                path = ((y, col + round(vx * (y - row) / vy)) for y in range(row, row + vy + shift, shift))
+            else:
+                path = ()
+            vertical = abs(vx) <= abs(vy)
+            stop = (row + vy, col + vx), FREE
+            for y, x in path:
+                kind = cells[y * width + x] if 0 <= y < height and 0 <= x < width else WALL
+                if kind != FREE:
+                    stop = (y, x), FREE if kind == FINISH and vertical else kind
+                    break
+            if key is not None:
+                if len(traces) >= TRACE_CACHE_SIZE:
+                    traces.clear()
+                traces[key] = stop
+            result.append(stop)
+        return result
+
+    def build_symbol_map(self) -> list[str]:
+        track_map = []
+        for i in range(self.height):
+            line = []
+            for j in range(self.width):
+                tile_id = self.get_tile_id((i, j))
+                symb = "#"
+                if tile_id in self.free_tiles:
+                    symb = "."
+                if tile_id in self.start_tiles:
+                    symb = "S"
+                elif tile_id in self.finish_tiles:
+                    symb = "F"
+                line.append(symb)
+            track_map.append("".join(line))
+        return track_map
 
 
 class Car:
 
     def __init__(self, pic, move_function, position, name, level, time=0):
         self.image = pic
+        self.images = {}
         self.row, self.col = position
         self.real_y, self.real_x = position
         self.move = move_function
@@ -134,18 +455,22 @@ class Car:
     def rotate_random(self):
         self.rotate_angle = randint(0, 359)
 
-    def render(self, screen, tile_size):
-        if self.image.get_width() != tile_size:
-            self.image = pygame.transform.smoothscale(self.image, (tile_size, tile_size * 1.6))
+    def get_image(self, tile_size):
+        if tile_size not in self.images:
+            self.images[tile_size] = pygame.transform.smoothscale(self.image, (tile_size, tile_size * 1.6))
+        return self.images[tile_size]
+
+    def render(self, screen, tile_size, offset=(0, 0)):
         # if not self.paused and (self.real_vx != 0 or self.real_vy != 0):
         #     self.rotate_angle = atan2(-self.real_vy, self.real_vx) * 180 / pi - 90
-        rotated_image = pygame.transform.rotate(self.image, self.rotate_angle)
-        delta_x = (rotated_image.get_width() - tile_size) // 2
-        delta_y = (rotated_image.get_height() - tile_size) // 2
+        rotated_image = pygame.transform.rotate(self.get_image(tile_size), self.rotate_angle)
+        delta_x = (rotated_image.get_width() - tile_size) // 2 + offset[0]
+        delta_y = (rotated_image.get_height() - tile_size) // 2 + offset[1]
         screen.blit(rotated_image, (self.real_x * tile_size - delta_x, self.real_y * tile_size - delta_y))
 
 
 class Boom:
+    images = []
 
     def __init__(self, position, cars, time):
         self.row, self.col = position
@@ -153,12 +478,6 @@ class Boom:
         for car in cars:
             car.paused = True
         self.time = time
-        self.images = [pygame.Surface((240, 240)).convert_alpha() for i in range(48)]
-        all_images = pygame.image.load(f"{IMAGES_DIR}/explosions-sprite.png").convert_alpha()
-        for k in range(48):
-            i = k // 8
-            j = k % 8
-            self.images[k].blit(all_images, (0, 0), (j * 256 + 8, i * 256 + 8, 240, 240))
         self.img_ind = 0
         self.activated = False
         self.ended = False
@@ -166,6 +485,17 @@ class Boom:
     def get_position(self):
         return self.row, self.col
 
+    @classmethod
+    def load_images(cls):
+        # the sprite is shared by all booms and loaded only when a boom is rendered
+        if not cls.images:
+            cls.images = [pygame.Surface((240, 240)).convert_alpha() for i in range(48)]
+            all_images = pygame.image.load(f"{IMAGES_DIR}/explosions-sprite.png").convert_alpha()
+            for k in range(48):
+                i = k // 8
+                j = k % 8
+                cls.images[k].blit(all_images, (0, 0), (j * 256 + 8, i * 256 + 8, 240, 240))
+
     def activate(self, free_tiles: list[tuple[int, int]]):
         if not self.activated:
             for car in self.cars:
@@ -173,13 +503,14 @@ class Boom:
                     car.set_position(free_tiles.pop())
             self.activated = True
 
-    def render(self, screen, tile_size):
+    def render(self, screen, tile_size, offset=(0, 0)):
+        self.load_images()
         if not self.ended:
             image = self.images[self.img_ind]
             if image.get_width() > 2 * tile_size:
                 image = pygame.transform.smoothscale(image, (2 * tile_size, 2 * tile_size))
-            delta_x = (image.get_width() - tile_size) // 2
-            delta_y = (image.get_height() - tile_size) // 2
+            delta_x = (image.get_width() - tile_size) // 2 + offset[0]
+            delta_y = (image.get_height() - tile_size) // 2 + offset[1]
             screen.blit(image, (self.col * tile_size - delta_x, self.row * tile_size - delta_y))
         self.img_ind += 4
         if self.img_ind >= len(self.images):
@@ -188,57 +519,78 @@ class Boom:
 
 class Game:
 
-    def __init__(self, labyrinth, cars):
+    def __init__(self, labyrinth, cars, streaming=False, seed=None, config=None, rendered=True):
         self.labyrinth = labyrinth
+        self.config = config or labyrinth.config
         self.cars = cars
         for car in self.cars:
             car.rotate_angle = self.labyrinth.start_angles[self.labyrinth.get_tile_id(car.get_position())]
         self.time = 0
+        self.random = Random(seed)
+        self.seed = seed
         self.results = []
-        self.booms = set()
-
-    def render(self, screen):
-        self.labyrinth.render(screen)
-        self.show_legend(screen)
+        self.booms = []
+        self.shared_track = None
+        # streaming mode keeps no history: events of the last tick only,
+        # finished cars and activated booms are dropped right away;
+        # results have one entry per finished car, so they are kept in any mode
+        self.streaming = streaming
+        # booms are removed when their animation ends in render(),
+        # a race that is never rendered drops them as soon as they are activated
+        self.rendered = rendered
+        self.events = []
+        self.parked = set()
+        self.finished_number = 0
+        self.last_result = 0
+        self.over = False
+
+    def render(self, screen, now=None):
+        camera = self.labyrinth.camera
+        screen.set_clip(camera.get_rect())
+        self.labyrinth.render(screen, camera, now)
         for car in self.cars:
-            car.render(screen, self.labyrinth.tile_size)
+            car.render(screen, camera.tile_size, camera.get_offset())
         for boom in list(self.booms):
             if boom.time <= self.time:
                 # boom.activate(self.free_neighbours(boom.get_position()))
-                boom.render(screen, self.labyrinth.tile_size)
+                boom.render(screen, camera.tile_size, camera.get_offset())
                 if boom.ended:
-                    self.booms.discard(boom)
+                    self.booms.remove(boom)
+        screen.set_clip(None)
+        self.show_legend(screen)
 
     def free_neighbours(self, position) -> list[tuple[int, int]]:
         row, col = position
-        cars_coords = {car.get_position() for car in self.cars}
+        cars_coords = self.car_cells()
         result = [(row + dy, col + dx) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
                   if self.labyrinth.is_in_map((row + dy, col + dx)) and
                   self.labyrinth.is_free((row + dy, col + dx)) and
                   ((row + dy, col + dx) not in cars_coords)]
-        shuffle(result)
+        self.random.shuffle(result)
         return result
 
     def symbol_map(self) -> list[str]:
-        track_map = []
-        cars_coords = {car.get_position() for car in self.cars}
-        for i in range(self.labyrinth.track.height):
-            line = []
-            for j in range(self.labyrinth.track.width):
-                tile_id = self.labyrinth.get_tile_id((i, j))
-                symb = "#"
-                if tile_id in self.labyrinth.free_tiles:
-                    symb = "."
-                if tile_id in self.labyrinth.start_tiles:
-                    symb = "S"
-                elif tile_id in self.labyrinth.finish_tiles:
-                    symb = "F"
-                if (i, j) in cars_coords:
-                    symb = "C"
-                line.append(symb)
-            track_map.append("".join(line))
+        track_map = self.labyrinth.symbols[:]
+        for row, col in self.car_cells():
+            if self.labyrinth.is_in_map((row, col)):
+                track_map[row] = track_map[row][:col] + "C" + track_map[row][col + 1:]
         return track_map
 
+    def car_cells(self) -> set[tuple[int, int]]:
+        return {car.get_position() for car in self.cars} | self.parked
+
+    def share_track(self, max_cars=None) -> SharedTrack:
+        if self.shared_track is None:
+            self.shared_track = SharedTrack.create(self.labyrinth.symbols, max_cars or len(self.cars))
+            self.shared_track.set_cars(self.car_cells())
+        return self.shared_track
+
+    def close(self):
+        """Frees the shared track, if the race made one."""
+        if self.shared_track is not None:
+            self.shared_track.close()
+            self.shared_track = None
+
     def move_cars_real(self):
         for car in self.cars:
             if car.time == self.time:
@@ -250,119 +602,138 @@ class Game:
                 if not car.finished:
                     car.rotate_random()
 
+    def emit(self, *event):
+        self.events.append(event)
+
+    def stream(self, max_ticks=None):
+        """
+        Runs the race without rendering and yields the events of every tick:
+        ("move", time, name, position, velocity), ("crash", time, position, [(name, position), ...]),
+        ("finish", time, name).
+        """
+        while not self.over and (max_ticks is None or self.time < max_ticks):
+            self.move_cars()
+            self.check_winners()
+            yield from self.events
+
     def move_cars(self):
+        moves = self.request_moves()
+        velocities = [velocity for car, velocity in moves if velocity is not None]
+        positions = [car.get_position() for car, velocity in moves if velocity is not None]
+        self.apply_moves(moves, self.labyrinth.trace_all(positions, velocities))
+
+    def request_moves(self) -> list:
+        """
+        Starts the next tick and asks the bots for new velocities.
+        Returns (car, (vy, vx)) for every car still racing, velocity is None for paused cars.
+        """
         self.time += 1
+        self.events = []
         track_map = self.symbol_map()
-        cars_coords = {}
+        if self.shared_track is not None:
+            self.shared_track.set_cars(self.car_cells())
+        moves = []
+        if self.seed is not None:
+            # bots that use the global random module get the same numbers in a seeded race
+            # whatever other races run in the process, e.g. alone and in a RaceBatch
+            random.seed((self.seed << 32) + self.time)
         for car in self.cars:
             if car.finished:
                 continue
             if car.paused:
-                if random() > car.level:
+                if self.random.random() > car.level:
                     car.paused = False
-                if car.get_position() not in cars_coords:
-                    cars_coords[car.get_position()] = []
-                cars_coords[car.get_position()].append(car)
+                moves.append((car, None))
                 continue
             car.time = self.time
             vy, vx = car.get_velocity()
             if not car.lost_control:
                 try:
-                    with time_limit(1):
+                    with time_limit(self.config.time_limit):
                         vx, vy = car.move(track_map[:], car.get_position()[::-1], car.get_velocity()[::-1])
                 except TimeoutException as e:
                     print(f"{car.name}: Timed out!")
                     car.lost_control = True
-                except BaseException:
-                    print(f"{car.name}: Bot error!")
+                except BaseException as e:
+                    print(f"{car.name}: Bot error! {e!r}")
                     car.lost_control = True
 
             if abs(vx - car.vx) > 1 or abs(vy - car.vy) > 1:
                 vy, vx = car.get_velocity()
-            next_row, next_col = car.row + vy, car.col + vx
-            if abs(vx) > abs(vy):
-                shift = 1 if vx > 0 else -1
-                x = car.col
-                while x != next_col + shift:
-                    y = car.row + round(vy * (x - car.col) / vx)
-                    if self.labyrinth.is_finish((y, x)):
-                        next_row, next_col = car.row + round(vy * (x - car.col) / vx), x
-                        car.set_velocity((0, 0))
-                        break
-                    elif not self.labyrinth.is_in_map((y, x)) or \
-                            not self.labyrinth.is_free((y, x)):
-                        self.booms.add(Boom((y, x), [car], self.time + 1))
-                        next_row, next_col = car.row + round(vy * (x - car.col) / vx), x
-                        car.set_velocity((0, 0))
-                        break
-                    x += shift
-                else:
-                    car.set_velocity((vy, vx))
-            elif vy:
-                shift = 1 if vy > 0 else -1
-                y = car.row
-                while y != next_row + shift:
-                    x = car.col + round(vx * (y - car.row) / vy)
-                    if self.labyrinth.is_finish((y, x)):
-                        next_row, next_col = y, car.col + round(vx * (y - car.row) / vy)
-                        car.set_velocity((0, 0))
-                    if not self.labyrinth.is_in_map((y, x)) or \
-                            not self.labyrinth.is_free((y, x)):
-                        self.booms.add(Boom((y, x), [car], self.time + 1))
-                        next_row, next_col = y, car.col + round(vx * (y - car.row) / vy)
-                        car.set_velocity((0, 0))
-                        break
-                    y += shift
-                else:
-                    car.set_velocity((vy, vx))
-            else:
-                next_row, next_col = car.row, car.col
-                car.set_velocity((vy, vx))
+            moves.append((car, (vy, vx)))
+        return moves
+
+    def apply_moves(self, moves, traces):
+        """
+        Finishes the tick: moves the cars to the cells where Labyrinth.trace_all stopped them
+        (traces go in the order of the moving cars), then handles crashes.
+        """
+        traces = iter(traces)
+        cars_coords = {}
+        for car, velocity in moves:
+            if velocity is None:
+                if car.get_position() not in cars_coords:
+                    cars_coords[car.get_position()] = []
+                cars_coords[car.get_position()].append(car)
+                continue
+            (next_row, next_col), kind = next(traces)
+            if kind == WALL:
+                self.booms.append(Boom((next_row, next_col), [car], self.time + 1))
+            car.set_velocity(velocity if kind == FREE else (0, 0))
             car.set_real_position(car.get_position())
             car.set_position((next_row, next_col))
-            real_vy = (next_row - car.get_real_position()[0]) / FRAMES_PER_TICK
-            real_vx = (next_col - car.get_real_position()[1]) / FRAMES_PER_TICK
+            real_vy = (next_row - car.get_real_position()[0]) / self.config.frames_per_tick
+            real_vx = (next_col - car.get_real_position()[1]) / self.config.frames_per_tick
             car.set_real_velocity((real_vy, real_vx))
-            if self.labyrinth.get_tile_id((next_row, next_col)) not in self.labyrinth.finish_tiles:
+            self.emit("move", self.time, car.name, car.get_position(), car.get_velocity())
+            if not self.labyrinth.is_finish((next_row, next_col)):
                 if (next_row, next_col) not in cars_coords:
                     cars_coords[(next_row, next_col)] = []
                 cars_coords[(next_row, next_col)].append(car)
         for coords in cars_coords:
             if len(cars_coords[coords]) > 1:
-                self.booms.add(Boom(coords, cars_coords[coords], self.time + 1))
+                self.booms.append(Boom(coords, cars_coords[coords], self.time + 1))
                 for car in cars_coords[coords]:
                     car.set_velocity((0, 0))
         for boom in self.booms:
-            boom.activate(self.free_neighbours(boom.get_position()))
+            if not boom.activated:
+                boom.activate(self.free_neighbours(boom.get_position()))
+                self.emit("crash", self.time, boom.get_position(),
+                          [(car.name, car.get_position()) for car in boom.cars])
+        if self.streaming or not self.rendered:
+            self.booms.clear()
 
     def check_winners(self) -> list[str]:
         for car in self.cars:
             if car.finished:
                 continue
-            if self.labyrinth.get_tile_id(car.get_position()) in self.labyrinth.finish_tiles:
+            if self.labyrinth.is_finish(car.get_position()):
                 car.finished = True
                 car.result = self.time
+                self.finished_number += 1
+                self.last_result = self.time
+                self.emit("finish", self.time, car.name)
                 self.results.append((car.name, self.time))
-        if len(self.results) < WINNERS_NUMBER or \
-                max(self.cars, key=lambda car: car.result if car.finished else 0).result == self.time:
+        if self.streaming:
+            self.parked.update(car.get_position() for car in self.cars if car.finished)
+            self.cars = [car for car in self.cars if not car.finished]
+        if self.finished_number < self.config.winners_number or self.last_result == self.time:
             return []
+        self.over = True
         return self.results
 
     def show_legend(self, screen):
         self.cars.sort(key=lambda x: x.result)
+        legend_x = min(self.labyrinth.width * self.labyrinth.tile_size, self.labyrinth.camera.view_width)
         for i in range(len(self.cars)):
             car = self.cars[i]
-            if car.image.get_width() != self.labyrinth.tile_size:
-                car.image = pygame.transform.smoothscale(car.image, (self.labyrinth.tile_size,
-                                                                     self.labyrinth.tile_size * 1.6))
-            screen.blit(car.image, (self.labyrinth.width * self.labyrinth.tile_size + 30,
-                                    50 + i * 50))
+            screen.blit(car.get_image(self.labyrinth.tile_size), (legend_x + 30, 50 + i * 50))
             font = pygame.font.Font(None, 30)
             text = font.render(car.name, 1, (150, 200, 200))
-            screen.blit(text, (self.labyrinth.width * self.labyrinth.tile_size + 60, 60 + i * 50))
+            screen.blit(text, (legend_x + 60, 60 + i * 50))
             if car.finished:
                 text = font.render(str(car.result), 1, (150, 200, 200))
-                screen.blit(text, (self.labyrinth.width * self.labyrinth.tile_size + 250, 60 + i * 50))
+                screen.blit(text, (legend_x + 250, 60 + i * 50))
 
 
 def show_message(screen, message):
@@ -389,21 +760,78 @@ def load_car_images() -> list:
     return car_surfaces
 
 
-def main():
-    pygame.init()
-    screen = pygame.display.set_mode(WINDOW_SIZE)
+def load_players(bots, players, time_limit=TIME_LIMIT) -> list[dict]:
+    result = []
+    for player in players:
+        if error := bots.validate(player["bot"], time_limit):
+            print(f"{player['name']}: Bot skipped! {error}")
+        else:
+            result.append(player)
+    return result
+
+
+def add_config_arguments(parser, many=False):
+    """--config and --level options of the command line tools, see load_config."""
+    if many:
+        parser.add_argument("--config", nargs="*", default=[],
+                            help="race configs, TOML or JSON, the races are run one after another")
+    else:
+        parser.add_argument("--config", help="race config, TOML or JSON")
+    parser.add_argument("--level", type=int, default=None, help="index in LEVELS, overrides the level of the config")
 
-    labyrinth = Labyrinth(LEVELS[CURRENT_LEVEL])
-    car_images = load_car_images()
+
+def load_config(path=None, level=None) -> RaceConfig:
+    """Race config from a TOML or JSON file, the default one without a path."""
+    config = RaceConfig.load(path) if path else RaceConfig()
+    if level is not None:
+        config = replace(config, level=LEVELS[level])
+    return config
+
+
+def create_game(config=None, headless=False, streaming=False, labyrinth=None, bots=None) -> Game:
+    config = config or RaceConfig()
+    if labyrinth is None:
+        labyrinth = Labyrinth(config.level, headless, config)
+    if bots is None:
+        bots = BotRegistry()
+    car_images = [None] * CAR_IMAGES_NUMBER if headless else load_car_images()
 
     start_positions = labyrinth.get_start_positions()
-    shuffle(start_positions)
-    cars = [Car(car_images[p["img"]], p["bot"], start_positions.pop(), p["name"], p["level"]) for p in PLAYERS]
+    Random(config.seed).shuffle(start_positions)
+    cars = [Car(car_images[p["img"]], bots.load(p["bot"]), start_positions.pop(), p["name"], p["level"])
+            for p in load_players(bots, config.players, config.time_limit)]
+    return Game(labyrinth, cars, streaming, config.seed, config, not headless)
+
+
+def control_camera(camera, event):
+    if event.type == pygame.MOUSEWHEEL:
+        camera.set_zoom(camera.zoom * ZOOM_STEP ** event.y, pygame.mouse.get_pos())
+    elif event.type == pygame.KEYDOWN:
+        step = 2 * camera.tile_size
+        if event.key == pygame.K_LEFT:
+            camera.scroll(-step, 0)
+        elif event.key == pygame.K_RIGHT:
+            camera.scroll(step, 0)
+        elif event.key == pygame.K_UP:
+            camera.scroll(0, -step)
+        elif event.key == pygame.K_DOWN:
+            camera.scroll(0, step)
+        elif event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+            camera.set_zoom(camera.zoom * ZOOM_STEP)
+        elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+            camera.set_zoom(camera.zoom / ZOOM_STEP)
+
+
+def main():
+    pygame.init()
+    screen = pygame.display.set_mode(WINDOW_SIZE)
 
-    game = Game(labyrinth, cars)
+    config = load_config(sys.argv[1] if len(sys.argv) > 1 else None)
+    game = create_game(config)
+    telemetry = TelemetryServer().start() if TELEMETRY else None
 
     clock = pygame.time.Clock()
-    pygame.time.set_timer(EVENT_TYPE, DELAY)
+    pygame.time.set_timer(EVENT_TYPE, config.delay)
     running = True
     game_over = False
     while running:
@@ -414,13 +842,20 @@ def main():
                 running = False
             if event.type == EVENT_TYPE and not game_over:
                 game.move_cars()
+                if telemetry:
+                    game.check_winners()
+                    telemetry.publish(game)
+            control_camera(game.labyrinth.camera, event)
         screen.fill((0, 0, 0))
         game.render(screen)
         if winners := game.check_winners():
             game_over = True
             # show_message(screen, "Winners: " + ", ".join(f"{player[0]}: {player[1]}" for player in winners))
         pygame.display.flip()
-        clock.tick(FPS)
+        clock.tick(config.fps)
+    if telemetry:
+        telemetry.close()
+    game.close()
     pygame.quit()
 
 
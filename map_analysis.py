@@ -0,0 +1,178 @@
+import os
+import sys
+
+from array import array
+from collections import deque
+from hashlib import sha1
+
+WALL, FREE, FINISH = 0, 1, 2
+CELL_KINDS = {"#": WALL, "F": FINISH}
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+NEIGHBOURS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx]
+CACHE_KEY_LENGTH = 16
+
+
+def track_key(track: list[str]) -> str:
+    """Hash of the track symbols, cars are ignored."""
+    return sha1("\n".join(track).replace("C", ".").encode()).hexdigest()
+
+
+class MapAnalysis:
+    """
+    One-time analysis of a symbol map (the one bots get, cars count as free cells).
+    All arrays are flat, index of (row, col) is row * width + col:
+        reachable --- 1 if a car can get to the cell from a start cell
+        regions --- id of the connected region of not-wall cells, 0 for walls
+        wall_distance --- 4 values per cell, how many cells a car can go up, down,
+            left and right before a wall, i.e. the maximum safe speed in that direction
+        obstacle_distance --- Chebyshev distance to the nearest wall or finish cell:
+            a move with max(abs(vy), abs(vx)) < obstacle_distance can't stop early
+    """
+
+    def __init__(self, track: list[str], cached: bytes = None):
+        self.height = len(track)
+        self.width = len(track[0]) if track else 0
+        self.cells = bytearray(CELL_KINDS.get(symb, FREE) for line in track for symb in line)
+        self.key = track_key(track)
+        self.starts = [row * self.width + col for row, line in enumerate(track)
+                       for col, symb in enumerate(line) if symb == "S"]
+        self.from_cache = cached is not None and self.read(cached)
+        if not self.from_cache:
+            self.reachable = self.find_reachable()
+            self.regions = self.find_regions()
+            self.wall_distance = self.find_wall_distance()
+            self.obstacle_distance = self.find_obstacle_distance()
+
+    @classmethod
+    def load(cls, track: list[str], path) -> "MapAnalysis":
+        """
+        Analysis of the track, cached in the file path.<key>.analysis:
+        every version of the track (e.g. other tile ids of a race config) gets its own file.
+        """
+        path = f"{path}.{track_key(track)[:CACHE_KEY_LENGTH]}.analysis"
+        cached = None
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    cached = f.read()
+            except OSError:
+                cached = None
+        analysis = cls(track, cached)
+        if not analysis.from_cache:
+            analysis.save(path)
+        return analysis
+
+    def header(self) -> bytes:
+        return f"{self.key} {sys.byteorder}\n".encode()
+
+    def read(self, data: bytes) -> bool:
+        """Takes the arrays from the bytes of a cache file, False if the file is of another track or broken."""
+        if not data.startswith(self.header()):
+            return False
+        size = len(self.cells)
+        arrays = [array("B"), array("i"), array("H"), array("H")]
+        offset = len(self.header())
+        for values, count in zip(arrays, (size, size, 4 * size, size)):
+            end = offset + count * values.itemsize
+            if end > len(data):
+                return False
+            values.frombytes(data[offset:end])
+            offset = end
+        if offset != len(data):
+            return False
+        self.reachable, self.regions, self.wall_distance, self.obstacle_distance = arrays
+        return True
+
+    def save(self, path):
+        try:
+            with open(path, "wb") as f:
+                f.write(self.header())
+                for values in (self.reachable, self.regions, self.wall_distance, self.obstacle_distance):
+                    values.tofile(f)
+        except OSError:
+            pass
+
+    def neighbours(self, index):
+        row, col = divmod(index, self.width)
+        for dy, dx in NEIGHBOURS:
+            if 0 <= row + dy < self.height and 0 <= col + dx < self.width:
+                yield (row + dy) * self.width + col + dx
+
+    def find_reachable(self) -> array:
+        reachable = array("B", bytes(len(self.cells)))
+        queue = deque(self.starts)
+        for index in self.starts:
+            reachable[index] = 1
+        while queue:
+            index = queue.popleft()
+            if self.cells[index] == FINISH:
+                continue
+            for neighbour in self.neighbours(index):
+                if not reachable[neighbour] and self.cells[neighbour] != WALL:
+                    reachable[neighbour] = 1
+                    queue.append(neighbour)
+        return reachable
+
+    def find_regions(self) -> array:
+        regions = array("i", bytes(4 * len(self.cells)))
+        region = 0
+        for start in range(len(self.cells)):
+            if regions[start] or self.cells[start] == WALL:
+                continue
+            region += 1
+            regions[start] = region
+            queue = deque([start])
+            while queue:
+                index = queue.popleft()
+                for neighbour in self.neighbours(index):
+                    if not regions[neighbour] and self.cells[neighbour] != WALL:
+                        regions[neighbour] = region
+                        queue.append(neighbour)
+        return regions
+
+    def find_wall_distance(self) -> array:
+        distance = array("H", bytes(8 * len(self.cells)))
+        for direction, (dy, dx) in enumerate(DIRECTIONS):
+            rows = range(self.height) if dy <= 0 else range(self.height - 1, -1, -1)
+            cols = range(self.width) if dx <= 0 else range(self.width - 1, -1, -1)
+            for row in rows:
+                for col in cols:
+                    if self.cells[row * self.width + col] == WALL:
+                        continue
+                    prev_row, prev_col = row + dy, col + dx
+                    if 0 <= prev_row < self.height and 0 <= prev_col < self.width and \
+                            self.cells[prev_row * self.width + prev_col] != WALL:
+                        prev = 4 * (prev_row * self.width + prev_col) + direction
+                        distance[4 * (row * self.width + col) + direction] = distance[prev] + 1
+        return distance
+
+    def find_obstacle_distance(self) -> array:
+        height, width = self.height, self.width
+        distance = array("H", bytes(2 * len(self.cells)))
+        for row in range(height):
+            for col in range(width):
+                if self.cells[row * width + col] == FREE:
+                    best = min(row + 1, col + 1, height - row, width - col)
+                    for dy, dx in ((-1, -1), (-1, 0), (-1, 1), (0, -1)):
+                        if 0 <= row + dy < height and 0 <= col + dx < width:
+                            best = min(best, distance[(row + dy) * width + col + dx] + 1)
+                    distance[row * width + col] = best
+        for row in range(height - 1, -1, -1):
+            for col in range(width - 1, -1, -1):
+                best = distance[row * width + col]
+                if best:
+                    for dy, dx in ((1, 1), (1, 0), (1, -1), (0, 1)):
+                        if 0 <= row + dy < height and 0 <= col + dx < width:
+                            best = min(best, distance[(row + dy) * width + col + dx] + 1)
+                    distance[row * width + col] = best
+        return distance
+
+    def is_reachable(self, position) -> bool:
+        return bool(self.reachable[position[0] * self.width + position[1]])
+
+    def get_region(self, position) -> int:
+        return self.regions[position[0] * self.width + position[1]]
+
+    def get_safe_speed(self, position, direction) -> int:
+        """direction --- (dy, dx) from DIRECTIONS"""
+        return self.wall_distance[4 * (position[0] * self.width + position[1]) + DIRECTIONS.index(direction)]
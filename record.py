@@ -0,0 +1,111 @@
+import argparse
+import os
+import subprocess
+
+# no window is needed: frames are rendered offscreen as fast as possible
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from main import add_config_arguments, create_game, load_config, FPS, WINDOW_SIZE
+
+MAX_TICKS = 1000
+
+
+class ImageSequence:
+
+    def __init__(self, directory, extension="png"):
+        self.directory = directory
+        self.extension = extension
+        self.frames = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, screen):
+        pygame.image.save(screen, os.path.join(self.directory, f"frame_{self.frames:06d}.{self.extension}"))
+        self.frames += 1
+
+    def close(self):
+        pass
+
+
+class EncoderPipe:
+    """
+    Streams raw RGB frames to an encoder, by default ffmpeg.
+    The output format is chosen by the file extension, e.g. .mp4 or .gif.
+    """
+
+    def __init__(self, output, size, fps=FPS, command=None):
+        if command is None:
+            command = ["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                       "-s", f"{size[0]}x{size[1]}", "-r", str(fps), "-i", "-", output]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self.frames = 0
+
+    def write(self, screen):
+        self.process.stdin.write(pygame.image.tostring(screen, "RGB"))
+        self.frames += 1
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+def record(game, screen, writer, frame_skip=1, max_ticks=MAX_TICKS) -> list:
+    """
+    Plays the race like main() does, but without waiting for the clock,
+    and passes every frame_skip-th frame to the writer instead of the display.
+    """
+    frame = 0
+    final_frames = game.config.fps
+    winners = []
+    while final_frames > 0 and game.time < max_ticks:
+        if not winners:
+            game.move_cars_real()
+            if (frame + 1) % game.config.frames_per_tick == 0:
+                game.move_cars()
+        screen.fill((0, 0, 0))
+        # frames are drawn faster than real time: animations follow the time of the video
+        game.render(screen, frame * 1000 // game.config.fps)
+        if not winners:
+            winners = game.check_winners()
+        else:
+            final_frames -= 1
+        if frame % frame_skip == 0:
+            writer.write(screen)
+        frame += 1
+    return winners
+
+
+def positive_int(value) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"should be 1 or more, got {value}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a race offscreen to images or a video.")
+    parser.add_argument("output", help="directory for an image sequence or a video file, e.g. race.mp4")
+    add_config_arguments(parser)
+    parser.add_argument("--frame-skip", type=positive_int, default=1, help="write every n-th frame")
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS)
+    args = parser.parse_args()
+
+    pygame.init()
+    screen = pygame.display.set_mode(WINDOW_SIZE)
+    config = load_config(args.config, args.level)
+    game = create_game(config)
+    if os.path.splitext(args.output)[1]:
+        writer = EncoderPipe(args.output, WINDOW_SIZE, max(1, config.fps // args.frame_skip))
+    else:
+        writer = ImageSequence(args.output)
+    try:
+        winners = record(game, screen, writer, args.frame_skip, args.max_ticks)
+    finally:
+        writer.close()
+        pygame.quit()
+    print(f"{writer.frames} frames, winners: " + ", ".join(f"{name}: {time}" for name, time in winners))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import sys
+import time
+
+from multiprocessing import resource_tracker, shared_memory
+from struct import calcsize, pack_into, unpack_from
+
+# height, width, max_cars, cars_number, version
+HEADER = "5i"
+HEADER_SIZE = calcsize(HEADER)
+CARS_NUMBER_OFFSET = calcsize("3i")
+VERSION_OFFSET = calcsize("4i")
+POSITION_SIZE = calcsize("2i")
+READ_RETRIES = 10000
+# blocks created by this process, the resource tracker unlinks them if the race dies
+created_blocks = set()
+
+
+class SharedTrack:
+    """
+    Static track symbols and a small car overlay in one shared memory block.
+    The race process creates it once, workers attach by name and read the
+    track without copying it through a pipe every tick.
+    Block layout: header, car positions (row, col), track symbols row by row.
+    """
+
+    def __init__(self, memory, owner=False):
+        self.memory = memory
+        self.owner = owner
+        self.height, self.width, self.max_cars = unpack_from("3i", memory.buf, 0)
+        self.cars_offset = HEADER_SIZE
+        self.grid_offset = HEADER_SIZE + self.max_cars * POSITION_SIZE
+        self.grid = memory.buf[self.grid_offset:self.grid_offset + self.height * self.width]
+
+    @classmethod
+    def create(cls, track: list[str], max_cars: int, name=None) -> "SharedTrack":
+        height, width = len(track), len(track[0]) if track else 0
+        size = HEADER_SIZE + max_cars * POSITION_SIZE + height * width
+        memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        created_blocks.add(memory.name)
+        pack_into(HEADER, memory.buf, 0, height, width, max_cars, 0, 0)
+        grid_offset = HEADER_SIZE + max_cars * POSITION_SIZE
+        memory.buf[grid_offset:grid_offset + height * width] = "".join(track).encode("ascii")
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedTrack":
+        # the block belongs to the race process: a worker must not unlink it on exit
+        if sys.version_info >= (3, 13):
+            memory = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            memory = shared_memory.SharedMemory(name=name)
+            if memory.name not in created_blocks:
+                resource_tracker.unregister(memory._name, "shared_memory")
+        return cls(memory)
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def set_cars(self, positions):
+        positions = list(positions)
+        if len(positions) > self.max_cars:
+            raise ValueError(f"{len(positions)} cars don't fit in the shared track for {self.max_cars} cars")
+        buf = self.memory.buf
+        version = unpack_from("i", buf, VERSION_OFFSET)[0]
+        # odd version --- the overlay is being written, readers retry
+        pack_into("i", buf, VERSION_OFFSET, version + 1)
+        for i, (row, col) in enumerate(positions):
+            pack_into("2i", buf, self.cars_offset + i * POSITION_SIZE, row, col)
+        pack_into("i", buf, CARS_NUMBER_OFFSET, len(positions))
+        pack_into("i", buf, VERSION_OFFSET, version + 2)
+
+    def get_cars(self) -> list[tuple[int, int]]:
+        buf = self.memory.buf
+        for retry in range(READ_RETRIES):
+            version = unpack_from("i", buf, VERSION_OFFSET)[0]
+            if version % 2 == 0:
+                cars_number = unpack_from("i", buf, CARS_NUMBER_OFFSET)[0]
+                cars = [unpack_from("2i", buf, self.cars_offset + i * POSITION_SIZE) for i in range(cars_number)]
+                if unpack_from("i", buf, VERSION_OFFSET)[0] == version:
+                    return cars
+            # let the writer finish
+            time.sleep(0)
+        raise TimeoutError("Car overlay is never complete, did the race process die while writing it?")
+
+    def get_symbol(self, position) -> str:
+        row, col = position
+        return chr(self.grid[row * self.width + col])
+
+    def symbol_map(self) -> list[str]:
+        """
+        Compatibility view for move(track, car_position, velocity): the same
+        list of strings Game.symbol_map() returns, with cars marked as "C".
+        """
+        grid = bytes(self.grid)
+        track_map = [grid[i * self.width:(i + 1) * self.width].decode("ascii") for i in range(self.height)]
+        for row, col in set(self.get_cars()):
+            if 0 <= row < self.height and 0 <= col < self.width:
+                track_map[row] = track_map[row][:col] + "C" + track_map[row][col + 1:]
+        return track_map
+
+    def close(self):
+        self.grid.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+            created_blocks.discard(self.memory.name)
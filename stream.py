@@ -0,0 +1,61 @@
+import argparse
+import json
+import os
+
+from main import add_config_arguments, create_game, load_config
+
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 3
+
+
+class EventLog:
+    """
+    Writes race events as JSON lines to a rolling file: when the file grows
+    over max_bytes it is renamed to path.1 (path.1 to path.2 and so on),
+    only backup_count old files are kept.
+    """
+
+    def __init__(self, path, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, event):
+        self.file.write(json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n")
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self.file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        self.file = open(self.path, "w", encoding="utf-8")
+
+    def close(self):
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a race without rendering and stream its events.")
+    parser.add_argument("output", help="JSON lines file")
+    add_config_arguments(parser)
+    parser.add_argument("--max-ticks", type=int, default=None)
+    parser.add_argument("--max-bytes", type=int, default=MAX_BYTES)
+    parser.add_argument("--backup-count", type=int, default=BACKUP_COUNT)
+    args = parser.parse_args()
+
+    game = create_game(load_config(args.config, args.level), headless=True, streaming=True)
+    log = EventLog(args.output, args.max_bytes, args.backup_count)
+    try:
+        for event in game.stream(args.max_ticks):
+            log.write(event)
+    finally:
+        log.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+import json
+import selectors
+import socket
+import sys
+import threading
+
+from collections import deque
+
+TELEMETRY_HOST = "127.0.0.1"
+TELEMETRY_PORT = 8765
+QUEUE_SIZE = 64
+
+
+def encode(message) -> bytes:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def snapshot(game) -> dict:
+    return {"type": "snapshot", "time": game.time, "track": game.labyrinth.symbols,
+            "cars": [[car.name, car.get_position(), car.get_velocity(), car.finished] for car in game.cars]}
+
+
+class Spectator:
+
+    def __init__(self, sock):
+        self.socket = sock
+        self.queue = deque()
+        self.buffer = b""
+        self.needs_snapshot = True
+
+
+class TelemetryServer:
+    """
+    Broadcasts the race to spectators over TCP as JSON lines: a snapshot with the track
+    and all cars when a spectator connects, then {"type": "tick", "time", "events"} with the
+    Game events of every tick. A message is encoded once for all spectators and sent from
+    a background thread. A spectator too slow to read QUEUE_SIZE ticks loses them and gets
+    a fresh snapshot instead, so the race never waits for it.
+    """
+
+    def __init__(self, host=TELEMETRY_HOST, port=TELEMETRY_PORT, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.spectators = []
+        self.lock = threading.Lock()
+        self.selector = selectors.DefaultSelector()
+        self.listener = socket.create_server((host, port))
+        self.listener.setblocking(False)
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.wake_reader.setblocking(False)
+        self.wake_writer.setblocking(False)
+        self.selector.register(self.wake_reader, selectors.EVENT_READ)
+        self.running = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    @property
+    def address(self):
+        return self.listener.getsockname()
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+        return self
+
+    def publish(self, game):
+        """Called by the race after every tick."""
+        with self.lock:
+            if not self.spectators:
+                return
+            tick = encode({"type": "tick", "time": game.time, "events": game.events})
+            state = None
+            for spectator in self.spectators:
+                if spectator.needs_snapshot:
+                    if state is None:
+                        state = encode(snapshot(game))
+                    spectator.queue.clear()
+                    spectator.queue.append(state)
+                    spectator.needs_snapshot = False
+                elif len(spectator.queue) >= self.queue_size:
+                    spectator.queue.clear()
+                    spectator.needs_snapshot = True
+                else:
+                    spectator.queue.append(tick)
+        self.wake()
+
+    def wake(self):
+        try:
+            self.wake_writer.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def run(self):
+        while self.running:
+            for key, mask in self.selector.select():
+                if key.fileobj is self.listener:
+                    self.accept()
+                elif key.fileobj is self.wake_reader:
+                    try:
+                        while self.wake_reader.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                else:
+                    spectator = key.data
+                    if mask & selectors.EVENT_READ:
+                        self.read(spectator)
+                    elif mask & selectors.EVENT_WRITE:
+                        self.send(spectator)
+            with self.lock:
+                spectators = list(self.spectators)
+            for spectator in spectators:
+                self.send(spectator)
+
+    def accept(self):
+        try:
+            sock, address = self.listener.accept()
+        except (BlockingIOError, OSError):
+            return
+        sock.setblocking(False)
+        spectator = Spectator(sock)
+        self.selector.register(sock, selectors.EVENT_READ, spectator)
+        with self.lock:
+            self.spectators.append(spectator)
+
+    def read(self, spectator):
+        # spectators don't send anything, an empty read means they left
+        try:
+            if not spectator.socket.recv(4096):
+                self.drop(spectator)
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.drop(spectator)
+
+    def send(self, spectator):
+        if spectator not in self.spectators:
+            return
+        try:
+            while True:
+                if not spectator.buffer:
+                    with self.lock:
+                        if not spectator.queue:
+                            break
+                        spectator.buffer = spectator.queue.popleft()
+                sent = spectator.socket.send(spectator.buffer)
+                spectator.buffer = spectator.buffer[sent:]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.drop(spectator)
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if spectator.buffer else 0)
+        self.selector.modify(spectator.socket, events, spectator)
+
+    def drop(self, spectator):
+        with self.lock:
+            if spectator in self.spectators:
+                self.spectators.remove(spectator)
+        try:
+            self.selector.unregister(spectator.socket)
+        except (KeyError, ValueError):
+            pass
+        spectator.socket.close()
+
+    def close(self):
+        self.running = False
+        self.wake()
+        if self.thread.is_alive():
+            self.thread.join()
+        for spectator in list(self.spectators):
+            self.drop(spectator)
+        self.selector.close()
+        self.listener.close()
+        self.wake_reader.close()
+        self.wake_writer.close()
+
+
+def spectate(host=TELEMETRY_HOST, port=TELEMETRY_PORT):
+    """Yields the messages of a telemetry server, e.g. to render the race on another machine."""
+    with socket.create_connection((host, port)) as sock, sock.makefile("rb") as stream:
+        for line in stream:
+            yield json.loads(line)
+
+
+def main():
+    host, port = TELEMETRY_HOST, TELEMETRY_PORT
+    if len(sys.argv) > 1:
+        host, _, port = sys.argv[1].rpartition(":")
+        host, port = host or TELEMETRY_HOST, int(port)
+    for message in spectate(host, port):
+        if message["type"] == "snapshot":
+            print("\n".join(message["track"]))
+            print(f"{message['time']}: " + ", ".join(f"{name} {position}" for name, position, *_ in message["cars"]))
+        else:
+            print(f"{message['time']}: " + ", ".join(" ".join(map(str, event[2:])) for event in message["events"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,16 +6,27 @@ class TimeoutException(Exception):
     pass
 
 
+def signal_handler(signum, frame):
+    raise TimeoutException("Timed out!")
+
+
+handler_installed = False
+
+
 @contextmanager
 def time_limit(seconds):
-    def signal_handler(signum, frame):
-        raise TimeoutException("Timed out!")
-    signal.signal(signal.SIGALRM, signal_handler)
-    signal.alarm(seconds)
+    global handler_installed
+    # installing a handler takes much longer than arming the timer and the handler
+    # never changes: time_limit owns SIGALRM, so it is installed once per process
+    if not handler_installed:
+        signal.signal(signal.SIGALRM, signal_handler)
+        handler_installed = True
+    # setitimer takes fractions of a second, signal.alarm only whole seconds
+    signal.setitimer(signal.ITIMER_REAL, seconds)
     try:
         yield
     finally:
-        signal.alarm(0)
+        signal.setitimer(signal.ITIMER_REAL, 0)
 
 
 if __name__ == "__main__":